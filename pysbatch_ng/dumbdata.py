@@ -6,7 +6,7 @@
 # This software is released under the MIT License.
 # https://opensource.org/licenses/MIT
 
-# Last modified: 21-10-2024 04:36:43
+# Last modified: 16-10-2026 02:30:06
 
 import subprocess
 from dataclasses import dataclass
@@ -42,10 +42,10 @@ class SStates(StrEnum):
 
     @staticmethod
     def from_string(state_str):
-        for state in SStates:
-            if state.value == state_str:
-                return state
-        return SStates.UNKNOWN_STATE
+        return states_by_str.get(state_str, SStates.UNKNOWN_STATE)
+
+
+states_by_str: dict[str, SStates] = {state.value: state for state in SStates}
 
 
 class SStatesShort(StrEnum):
@@ -77,48 +77,51 @@ class SStatesShort(StrEnum):
 
     @staticmethod
     def from_string(state_str):
-        for state in SStatesShort:
-            print(f"Comparing: {state.value} and {state_str}")
+        for state in short_states_by_len:
             if state.value in state_str:
-                print("Match")
                 return state
         return SStatesShort.UNKNOWN_STATE
 
 
+# longest codes first, so that e.g. "PR" is not taken for "R"
+short_states_by_len: tuple[SStatesShort, ...] = tuple(sorted(SStatesShort, key=lambda state: len(state.value), reverse=True))
+
+
+job_state_descriptions: dict[SStates, str] = {
+    SStates.PENDING: "Job is waiting for resource allocation.",
+    SStates.RUNNING: "Job currently has an allocation.",
+    SStates.SUSPENDED: "Job has an allocation but execution has been suspended.",
+    SStates.COMPLETED: "Job has terminated all processes on all nodes.",
+    SStates.CANCELLED: "Job was explicitly cancelled by the user or system administrator.",
+    SStates.FAILED: "Job terminated with a non-zero exit code or other failure condition.",
+    SStates.TIMEOUT: "Job terminated upon reaching its time limit.",
+    SStates.NODE_FAIL: "Job terminated due to a failure of one or more allocated nodes.",
+    SStates.PREEMPTED: "Job terminated due to preemption.",
+    SStates.BOOT_FAIL: "Job terminated due to a failure in booting up the allocated node.",
+    SStates.DEADLINE: "Job terminated due to deadline violation.",
+    SStates.OUT_OF_MEMORY: "Job experienced an out of memory error.",
+    SStates.COMPLETING: "Job is in the process of completing.",
+    SStates.CONFIGURING: "Job is being configured.",
+    SStates.RESV_DEL_HOLD: "Job is in reservation delete hold.",
+    SStates.REQUEUE_FED: "Job is being requeued by a federation.",
+    SStates.REQUEUE_HOLD: "Held job is being requeued.",
+    SStates.REQUEUED: "Job is requeued.",
+    SStates.RESIZING: "Job is about to change size.",
+    SStates.REVOKED: "Sibling was removed from cluster due to other cluster starting the job.",
+    SStates.SIGNALING: "Job is being signaled.",
+    SStates.SPECIAL_EXIT: "Job terminated with a special exit code.",
+    SStates.STAGE_OUT: "Job is staging out files.",
+    SStates.STOPPED: "Job has been stopped.",
+    SStates.UNKNOWN_STATE: "Job state is unknown or pysbatch-ng was unable to determine it.",
+}
+
+
 def get_job_state_description(state: SStates) -> str:
     """Return a description for the given SlurmJobState."""
-    descriptions = {
-        SStates.PENDING: "Job is waiting for resource allocation.",
-        SStates.RUNNING: "Job currently has an allocation.",
-        SStates.SUSPENDED: "Job has an allocation but execution has been suspended.",
-        SStates.COMPLETED: "Job has terminated all processes on all nodes.",
-        SStates.CANCELLED: "Job was explicitly cancelled by the user or system administrator.",
-        SStates.FAILED: "Job terminated with a non-zero exit code or other failure condition.",
-        SStates.TIMEOUT: "Job terminated upon reaching its time limit.",
-        SStates.NODE_FAIL: "Job terminated due to a failure of one or more allocated nodes.",
-        SStates.PREEMPTED: "Job terminated due to preemption.",
-        SStates.BOOT_FAIL: "Job terminated due to a failure in booting up the allocated node.",
-        SStates.DEADLINE: "Job terminated due to deadline violation.",
-        SStates.OUT_OF_MEMORY: "Job experienced an out of memory error.",
-        SStates.COMPLETING: "Job is in the process of completing.",
-        SStates.CONFIGURING: "Job is being configured.",
-        SStates.RESV_DEL_HOLD: "Job is in reservation delete hold.",
-        SStates.REQUEUE_FED: "Job is being requeued by a federation.",
-        SStates.REQUEUE_HOLD: "Held job is being requeued.",
-        SStates.REQUEUED: "Job is requeued.",
-        SStates.RESIZING: "Job is about to change size.",
-        SStates.REVOKED: "Sibling was removed from cluster due to other cluster starting the job.",
-        SStates.SIGNALING: "Job is being signaled.",
-        SStates.SPECIAL_EXIT: "Job terminated with a special exit code.",
-        SStates.STAGE_OUT: "Job is staging out files.",
-        SStates.STOPPED: "Job has been stopped.",
-        SStates.UNKNOWN_STATE: "Job state is unknown or pysbatch-ng was unable to determine it.",
-    }
-
-    return descriptions.get(state, "Unknown job state.")
-
-
-@dataclass
+    return job_state_descriptions.get(state, "Unknown job state.")
+
+
+@dataclass(slots=True, frozen=True)
 class SlurmJobInfo:
     job_id: str
     job_name: str
@@ -131,63 +134,13 @@ class SlurmJobInfo:
     signal: int
 
 
-all_states = [
-    SStates.BOOT_FAIL,
-    SStates.CANCELLED,
-    SStates.COMPLETED,
-    SStates.CONFIGURING,
-    SStates.COMPLETING,
-    SStates.DEADLINE,
-    SStates.FAILED,
-    SStates.NODE_FAIL,
-    SStates.OUT_OF_MEMORY,
-    SStates.PENDING,
-    SStates.PREEMPTED,
-    SStates.RUNNING,
-    SStates.RESV_DEL_HOLD,
-    SStates.REQUEUE_FED,
-    SStates.REQUEUE_HOLD,
-    SStates.REQUEUED,
-    SStates.RESIZING,
-    SStates.REVOKED,
-    SStates.SIGNALING,
-    SStates.SPECIAL_EXIT,
-    SStates.STAGE_OUT,
-    SStates.STOPPED,
-    SStates.SUSPENDED,
-    SStates.TIMEOUT,
-]
-
-
-states_str = [
-    "BOOT_FAIL",
-    "CANCELLED",
-    "COMPLETED",
-    "CONFIGURING",
-    "COMPLETING",
-    "DEADLINE",
-    "FAILED",
-    "NODE_FAIL",
-    "OUT_OF_MEMORY",
-    "PENDING",
-    "PREEMPTED",
-    "RUNNING",
-    "RESV_DEL_HOLD",
-    "REQUEUE_FED",
-    "REQUEUE_HOLD",
-    "REQUEUED",
-    "RESIZING",
-    "REVOKED",
-    "SIGNALING",
-    "SPECIAL_EXIT",
-    "STAGE_OUT",
-    "STOPPED",
-    "SUSPENDED",
-    "TIMEOUT",
-]
-
-
-failure_states = [
+all_states: frozenset[SStates] = frozenset(SStates) - {SStates.UNKNOWN_STATE}
+
+
+states_str: tuple[str, ...] = tuple(state.value for state in SStates if state is not SStates.UNKNOWN_STATE)
+
+
+failure_states: frozenset[SStates] = frozenset({
     SStates.BOOT_FAIL,
     SStates.DEADLINE,
     SStates.NODE_FAIL,
@@ -195,13 +148,13 @@ failure_states = [
     SStates.STOPPED,
     SStates.FAILED,
     SStates.CANCELLED,
-]
+})
 
 
-states_to_end = [
+states_to_end: frozenset[SStates] = frozenset({
     SStates.COMPLETED,
     SStates.TIMEOUT,
-]
+})
 
 
 if __name__ == "__main__":
@@ -6,11 +6,14 @@
 # This software is released under the MIT License.
 # https://opensource.org/licenses/MIT
 
-# Last modified: 26-10-2024 09:32:44
+# Last modified: 16-10-2026 02:44:02
 
-from typing import Any
+import os
+import shlex
+import shutil
+from typing import Any, Iterable
 from pathlib import Path
-from dataclasses import dataclass
+from dataclasses import dataclass, fields as dataclass_fields
 
 from marshmallow import Schema, fields, post_load
 
@@ -19,11 +22,8 @@ from .utils import is_exe, log
 
 class StrPath(fields.Field):
     def _deserialize(self, value: str, attr, data, **kwargs) -> Path | str:
-        try:
-            a = Path(value).resolve(True)
-            return a
-        except Exception:
-            return value
+        real = os.path.realpath(value)
+        return Path(real) if os.path.exists(real) else value
 
     def _serialize(self, value: str | Path, attr, obj, **kwargs) -> str:
         return value.as_posix() if isinstance(value, Path) else value
@@ -34,32 +34,48 @@ class Execs:
     sinfo:  str = "sinfo"
     sbatch: str = "sbatch"
     sacct:  str = "sacct"
+    squeue: str = "squeue"
+    strigger: str = "strigger"
     spoll:  str = "spoll"
     spolld: str = "spolld"
 
-    def check(self, strict: bool) -> bool:
+    def check(self, strict: bool, names: Iterable[str] | None = None) -> bool:
+        """Checks that executables exist (only the given ones, if names is specified) and replaces bare names with absolute paths, so PATH is searched only once"""
         logger = log.get_logger()
-        for exec in [self.sinfo, self.sbatch, self.sacct, self.spoll, self.spolld]:
-            if not is_exe(exec):
-                logger.error(f"Executable {exec} not found")
+        if names is None:
+            names = [field.name for field in dataclass_fields(self)]
+        for name in names:
+            exec = getattr(self, name)
+            resolved = shutil.which(exec)
+            if resolved is not None:
+                setattr(self, name, resolved)
+            elif not is_exe(exec):
+                logger.error(f"Executable {exec} ({name}) not found")
                 return False
         return True
 
     @classmethod
     def from_schema(cls, data: dict[str, Any], immidiate_check: bool = False, strict: bool = False):
-        schema = ExecsSchema()
-        execs = schema.load(data)
-        if not isinstance(execs, Execs):
-            raise ValueError("")
+        names = {field.name for field in dataclass_fields(cls)}
+        unknown = data.keys() - names
+        if len(unknown) != 0:
+            raise ValueError(f"Unknown executables: {', '.join(sorted(unknown))}")
+        for name, value in data.items():
+            if not isinstance(value, str):
+                raise ValueError(f"Executable '{name}' must be a string, got {value!r}")
+        execs = cls(**data)
         if immidiate_check:
             if not execs.check(strict):
                 raise RuntimeError("")
+        return execs
 
 
 class ExecsSchema(Schema):
     sinfo  = fields.String(missing="sinfo")
     sbatch = fields.String(missing="sbatch")
     sacct  = fields.String(missing="sacct")
+    squeue = fields.String(missing="squeue")
+    strigger = fields.String(missing="strigger")
     spoll  = fields.String(missing="spoll")
     spolld = fields.String(missing="spolld")
 
@@ -88,6 +104,10 @@ class CMD:
     def gen_line(self):
         return f"{self.preload} {self.executable} {self.args}"
 
+    def gen_argv(self) -> list[str]:
+        assert self.executable is not None
+        return [*shlex.split(self.preload), self.executable, *shlex.split(self.args)]
+
 
 class CMDSchema(Schema):
     preload = fields.String(missing="")
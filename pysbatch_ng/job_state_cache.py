@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Copyright (c) 2023-2024 Perevoshchikov Egor
+#
+# This software is released under the MIT License.
+# https://opensource.org/licenses/MIT
+
+# Last modified: 16-10-2026 02:44:35
+
+import re
+import time
+import threading
+import subprocess
+from typing import Iterable, Iterator
+
+from .utils import wexec, log
+from .execs import Execs
+from .dumbdata import SStates
+
+
+regex_squeue_line = re.compile(r"^(\d+),([A-Z_]+)", re.MULTILINE)
+
+# keeps command lines well below ARG_MAX
+max_jobids_per_call: int = 500
+
+
+def chunked(jobids: Iterable[int], size: int = max_jobids_per_call) -> Iterator[list[int]]:
+    chunk: list[int] = []
+    for jobid in jobids:
+        chunk.append(jobid)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def parse_squeue_states(output: str) -> dict[int, SStates]:
+    """Parses output of squeue -h -o %i,%T"""
+    return {int(match.group(1)): SStates.from_string(match.group(2)) for match in regex_squeue_line.finditer(output)}
+
+
+def parse_sacct_states(output: str) -> dict[int, SStates]:
+    """Parses output of sacct -n -p -o jobid,state, job steps are skipped"""
+    states: dict[int, SStates] = {}
+    for line in output.splitlines():
+        # expected format: "<jobid>|<STATE>|"
+        jobid, sep, state = line.partition('|')
+        if not (sep and state.endswith('|') and jobid.isdigit()):
+            continue
+        state = state[:-1]
+        if state.replace('_', '').isalpha():
+            states[int(jobid)] = SStates.from_string(state)
+    return states
+
+
+def sacct_states(sacct: str, jobids: Iterable[int]) -> dict[int, SStates]:
+    """Queries states of jobs from slurmdbd, one sacct call per max_jobids_per_call jobs"""
+    states: dict[int, SStates] = {}
+    for chunk in chunked(jobids):
+        bout, berr = wexec(f"{sacct} -j {','.join(map(str, chunk))} -X -n -p -o jobid,state")
+        states.update(parse_sacct_states(bout))
+    return states
+
+
+class JobStateCache:
+    """Process-wide job states of all registered jobs, refreshed with batched squeue/sacct calls"""
+    __lock: threading.Lock
+    __jobids: set[int]
+    __states: dict[int, SStates]
+    __timestamp: float
+    __only_job_state_supported: bool
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__jobids = set()
+        self.__states = {}
+        self.__timestamp = float("-inf")
+        self.__only_job_state_supported = True
+
+    def register(self, jobid: int) -> None:
+        with self.__lock:
+            if jobid not in self.__jobids:
+                self.__jobids.add(jobid)
+                # force next get() to query the new job
+                self.__timestamp = float("-inf")
+
+    def unregister(self, jobid: int) -> None:
+        with self.__lock:
+            self.__jobids.discard(jobid)
+            self.__states.pop(jobid, None)
+
+    def invalidate(self) -> None:
+        """Makes next get() query slurm regardless of max_age"""
+        with self.__lock:
+            self.__timestamp = float("-inf")
+
+    def get(self, jobid: int, max_age: float, execs: Execs, only_job_state: bool = True) -> SStates:
+        """Returns state of the job, refreshing states of all registered jobs if they are older than max_age seconds"""
+        with self.__lock:
+            if jobid not in self.__jobids:
+                self.__jobids.add(jobid)
+                self.__timestamp = float("-inf")
+            if time.monotonic() - self.__timestamp >= max_age:
+                self.__refresh(execs, only_job_state)
+            return self.__states.get(jobid, SStates.UNKNOWN_STATE)
+
+    def __refresh(self, execs: Execs, only_job_state: bool) -> None:
+        states: dict[int, SStates] = {}
+        for chunk in chunked(sorted(self.__jobids)):
+            states.update(self.__squeue_states(execs, chunk, only_job_state and self.__only_job_state_supported))
+
+        # jobs that have left the queue, their final state is known only to slurmdbd
+        gone = [jobid for jobid in self.__jobids if states.get(jobid, SStates.UNKNOWN_STATE) == SStates.UNKNOWN_STATE]
+        states.update(sacct_states(execs.sacct, sorted(gone)))
+
+        self.__states = states
+        self.__timestamp = time.monotonic()
+
+    def __squeue_states(self, execs: Execs, chunk: list[int], only_job_state: bool) -> dict[int, SStates]:
+        jobids = ','.join(map(str, chunk))
+        if only_job_state:
+            try:
+                bout, berr = wexec(f"{execs.squeue} --only-job-state -h -j {jobids} -o %i,%T", quiet=True)
+                return parse_squeue_states(bout)
+            except subprocess.CalledProcessError:
+                pass
+        try:
+            bout, berr = wexec(f"{execs.squeue} -h -j {jobids} -o %i,%T", quiet=True)
+        except subprocess.CalledProcessError:
+            # none of the jobs is known to slurmctld anymore
+            return {}
+        if only_job_state:
+            # plain query works where --only-job-state did not: slurm older than 23.02
+            logger = log.get_logger()
+            logger.debug("squeue does not support --only-job-state, not using it anymore")
+            self.__only_job_state_supported = False
+        return parse_squeue_states(bout)
+
+
+job_state_cache = JobStateCache()
+
+
+if __name__ == "__main__":
+    pass
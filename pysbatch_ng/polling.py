@@ -6,28 +6,35 @@
 # This software is released under the MIT License.
 # https://opensource.org/licenses/MIT
 
-# Last modified: 26-10-2024 09:32:44
+# Last modified: 16-10-2026 02:44:35
 
 import os
-import re
 import sys
 import time
+import fcntl
 import shlex
+import random
+import signal
+import getpass
+import select
+import socket
+import logging
 import argparse
 import subprocess
 from pathlib import Path
-from typing import Any, Type
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Type
 
-import toml
 from marshmallow import Schema, fields, post_load, validate
 
 from .execs import Execs, ExecsSchema, CMD, CMDSchema
-from .utils import wexec, FieldPath, log2type, log2list, log
+from .utils import wexec, load_toml, inotify_watch, inotify_read_names, inotify_events, FieldPath, log2type, log2list, log
 from .dumbdata import SStates, states_to_end, failure_states, SlurmJobInfo
+from .job_state_cache import job_state_cache, chunked, sacct_states
 
 
 class PollerSchema(Schema):
-    execs = fields.Nested(ExecsSchema, missing=Execs())
+    execs = fields.Nested(ExecsSchema, missing=Execs)
     jobid = fields.Integer(allow_none=True, missing=None)
     debug = fields.Boolean(default=True, missing=True)
     logto = fields.String(default='file', missing='file', validate=validate.OneOf(log2list))
@@ -35,45 +42,105 @@ class PollerSchema(Schema):
     tag = fields.Integer(allow_none=True, missing=None)
     every = fields.Integer(missing=5)
     times_criteria = fields.Integer(missing=288)
+    only_job_state = fields.Boolean(default=True, missing=True)
+    use_strigger = fields.Boolean(default=False, missing=False)
+    watch_path = fields.String(allow_none=True, missing=None)
+    watch_event = fields.String(default='close_write', missing='close_write', validate=validate.OneOf(list(inotify_events)))
     cmd = fields.Nested(CMDSchema, allow_none=True, missing=None, read_only=True)
     lockfilename = fields.String(allow_none=True, default="auto", missing=None)
 
     logfolder = fields.String(allow_none=True, missing=None, load_only=True)
-    logfolder_p = FieldPath(default=Path.cwd(), attribute='logfolder', data_key='logfolder', dump_only=True)
-    cwd = FieldPath(missing=Path.cwd())
+    logfolder_p = FieldPath(default=Path.cwd, attribute='logfolder', data_key='logfolder', dump_only=True)
+    cwd = FieldPath(missing=Path.cwd)
 
     @post_load
     def make_spoll(self, data, **kwargs):
         return Poller(**data)
 
+
+_poller_schema = PollerSchema()
+
+
+# poll interval is multiplied by the factor while job stays in the state, up to backoff_cap * every.
+# RUNNING is not backed off: completion should be noticed within 'every'
+backoff_factors: dict[SStates, float] = {SStates.PENDING: 2.0}
+backoff_cap: int = 16
+
+
+@lru_cache(maxsize=1)
+def _current_user() -> str:
+    return getpass.getuser()
+
+
+@lru_cache(maxsize=1)
+def _user_ttys(ttl_bucket: int) -> tuple[str, ...]:
+    user = _current_user()
+    bout, berr = wexec('who')
+    return tuple(f"/dev/{parts[1]}" for parts in map(str.split, bout.splitlines()) if len(parts) > 1 and parts[0] == user)
+
+
+# terminals stay open between messages, closed and forgotten on the first write error
+_terminals: dict[str, int] = {}
+
+
+def _close_terminals() -> None:
+    for fd in _terminals.values():
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+    _terminals.clear()
+
+
 class Poller:
-    execs: Execs = Execs()
+    execs: Execs
     debug: bool = True
     jobid: int | None = None
     tag: int | None = None
     every: int = 5
     times_criteria: int = 288
+    only_job_state: bool = True
+    use_strigger: bool = False
+    watch_path: str | None = None
+    watch_event: str = 'close_write'
     cmd: CMD | None = None
     cwd: Path
     logto: log2type
 
     __lockfile: Path
+    __lock_fd: int = -1
     logfolder: Path
     __ok: bool = False
     __allow: bool = False
     __current_state: SStates = SStates.PENDING
+    __last_state: SStates
+    __last_state_times: int
+    __wake_r: int = -1
+    __wake_w: int = -1
+    __trigger_r: int = -1
+    __trigger_w: int = -1
+    __trigger_set: bool = False
+    __stop: bool = False
+    __watch_fd: int = -1
+    __watch_path: Path
     __job: SlurmJobInfo
 
     def check(self, strict: bool) -> bool:
         logger = log.get_logger()
-        if not self.cwd.exists():
+        if not self.cwd.is_dir():
             logger.error("Current working directory does not exists")
             return False
 
-        if not self.logfolder.exists():
+        try:
             self.logfolder.mkdir(parents=True, exist_ok=True)
+        except OSError as e:
+            logger.error(f"Unable to create log folder {self.logfolder.as_posix()}: {e}")
+            return False
 
-        if not self.execs.check(strict):
+        execs_used = ["squeue", "sacct", "spolld"]
+        if self.use_strigger:
+            execs_used.append("strigger")
+        if not self.execs.check(strict, execs_used):
             logger.error("Some executables were not found")
             return False
 
@@ -100,10 +167,14 @@ class Poller:
         tag: int | None = None,
         every: int = 5,
         times_criteria: int = 288,
+        only_job_state: bool = True,
+        use_strigger: bool = False,
+        watch_path: str | None = None,
+        watch_event: str = 'close_write',
         logfolder: str | None = None,
         lockfilename: str | None = None,
-        cwd: Path = Path.cwd(),
-        execs: Execs = Execs()
+        cwd: Path | None = None,
+        execs: Execs | None = None
     ):
         self.jobid = jobid
         self.cmd = cmd
@@ -111,8 +182,13 @@ class Poller:
         self.tag = tag
         self.every = every
         self.times_criteria = times_criteria
-        self.cwd = cwd.resolve()
-        self.execs = execs
+        self.only_job_state = only_job_state
+        self.use_strigger = use_strigger
+        self.watch_path = watch_path
+        self.watch_event = watch_event
+        # Path.cwd() is already absolute and symlink-free
+        self.cwd = Path.cwd() if cwd is None else (cwd if cwd.is_absolute() else cwd.resolve())
+        self.execs = Execs() if execs is None else execs
 
         # os.chdir(self.cwd)
 
@@ -131,10 +207,9 @@ class Poller:
 
     @classmethod
     def from_schema(cls, data: dict[str, Any], immidiate_check: bool = False, strict: bool = False):
-        schema = PollerSchema()
+        schema = _poller_schema
         spoll = schema.load(data)
-        if not isinstance(spoll, Poller):
-            raise ValueError("")
+        assert isinstance(spoll, Poller)
         if immidiate_check:
             if not spoll.check(strict):
                 raise RuntimeError("")
@@ -159,8 +234,7 @@ class Poller:
     def from_args(cls, args: argparse.Namespace) -> "Poller":
         conf: dict[str, Any] = {}
         if args.file:
-            with Path(args.file).resolve().open('r') as fp:
-                conf = toml.load(fp)
+            conf = load_toml(Path(args.file))
 
         obj_dict: dict[str, Any] = {}
 
@@ -194,7 +268,7 @@ class Poller:
             logger.error("Check not passed")
             return 2
 
-        schema = PollerSchema()
+        schema = _poller_schema
         d = schema.dump(self)
         if not isinstance(d, dict):
             logger.critical("d is not dict")
@@ -206,18 +280,18 @@ class Poller:
         wfile = self.logfolder / cf
 
 
+        import toml  # only needed to write configuration, spolld daemon never loads it
         with wfile.open('w') as fp:
             toml.dump(d, fp)
 
-        cmd = f"{self.execs.spolld} --file={wfile.as_posix()}"
-        cmds = shlex.split(cmd)
+        cmds = [self.execs.spolld, f"--file={wfile.as_posix()}"]
         subprocess.Popen(cmds, start_new_session=True)
 
     @classmethod
     def genconf(cls, write: bool = False, wfolder: Path | None = None):
         logger = log.get_logger()
         p = Poller()
-        schema = PollerSchema()
+        schema = _poller_schema
         d = schema.dump(p)
         if not isinstance(d, dict):
             logger.critical("d is not dict")
@@ -225,6 +299,7 @@ class Poller:
         if write:
             wfolder = Path.cwd() if wfolder is None else wfolder
             wfile = wfolder / "Sample_poll_configuration.toml"
+            import toml
             with wfile.open('w') as fp:
                 toml.dump(d, fp)
             logger.info(f"Sample confguration was written to {wfile.as_posix()}")
@@ -237,27 +312,64 @@ class Poller:
             logfile_name = f"{self.tag}_{logfile_name}"
         return logfile_name
 
+    def __acquire_lockfile(self) -> bool:
+        """Takes exclusive flock on the lockfile, returns False if another poller holds it.
+        Kernel releases the lock when the holder dies, so leftover lockfiles need no stale detection"""
+        while True:
+            fd = os.open(self.__lockfile, os.O_CREAT | os.O_RDWR | os.O_CLOEXEC, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            # previous holder could unlink the file between our open() and flock(), then the lock is on a dead inode
+            try:
+                st = os.stat(self.__lockfile)
+            except FileNotFoundError:
+                st = None
+            fst = os.fstat(fd)
+            if st is not None and (st.st_dev, st.st_ino) == (fst.st_dev, fst.st_ino):
+                break
+            os.close(fd)
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()} {socket.gethostname()}\n".encode())
+        self.__lock_fd = fd
+        return True
+
+    def __release_lockfile(self, unlink: bool) -> None:
+        if self.__lock_fd < 0:
+            return
+        # unlink while still holding the lock, so nobody can lock the inode being removed
+        if unlink:
+            self.__lockfile.unlink(missing_ok=True)
+        os.close(self.__lock_fd)
+        self.__lock_fd = -1
+
     def __enter__(self):
         logger = log.get_logger()
         if not self.check(True):
             raise RuntimeError("Invalud conf")
-        if self.__lockfile.exists():
-            logger.error(f"Lockfile exists: {self.__lockfile.as_posix()}")
-            raise RuntimeError(f"Lockfile exists: {self.__lockfile.as_posix()}")
-        self.__lockfile.touch()
-        logger.debug("Created lockfile")
+        if not self.__acquire_lockfile():
+            logger.error(f"Lockfile is held by another poller: {self.__lockfile.as_posix()}")
+            raise RuntimeError(f"Lockfile is held by another poller: {self.__lockfile.as_posix()}")
+        logger.debug("Acquired lockfile")
+        if self.jobid is not None:
+            job_state_cache.register(self.jobid)
         self.__allow = True
         return self
 
     def __exit__(self, exc_type: Type[Exception], exc_value: Exception, exc_traceback) -> None:
         logger = log.get_logger()
         self.__allow = False
+        if self.jobid is not None:
+            job_state_cache.unregister(self.jobid)
         if not self.__ok:
-            logger.debug("Loop was not ok, not deleting lock, not launching cmd")
+            logger.debug("Loop was not ok, not deleting lockfile, not launching cmd")
+            self.__release_lockfile(unlink=False)
             return
 
         logger.debug("Loop ok, deleting lock")
-        self.__lockfile.unlink(missing_ok=True)
+        self.__release_lockfile(unlink=True)
         if self.state in failure_states:
             logger.warning("Job seems to be failed. Not launching cmd")
             return
@@ -265,13 +377,15 @@ class Poller:
             logger.warning("Job seems to be completed. Not launching cmd")
             return
         logger.debug("Checking for cmd")
-        if (self.cwd / "NORESTART").exists():
+        if os.access(self.cwd / "NORESTART", os.F_OK):
             logger.info("NORESTART found, not launching cmd")
         else:
             if self.cmd is not None:
                 logger.info(f"Launching: {self.cmd}")
-                cmds = shlex.split(self.cmd.gen_line())
-                subprocess.Popen(cmds, start_new_session=True)
+                cmd_log = self.logfolder / self.logfile_name.replace("_poll.log", "_cmd.log")
+                with cmd_log.open('ab') as fh:
+                    subprocess.Popen(self.cmd.gen_argv(), stdin=subprocess.DEVNULL, stdout=fh, stderr=subprocess.STDOUT, start_new_session=True)
+                logger.info(f"Command output goes to {cmd_log.as_posix()}")
                 logger.info("Succesfully launched command.")
             else:
                 logger.info("No cmd was specified")
@@ -316,28 +430,35 @@ class Poller:
                 job_infos.append(job_info)
         return job_infos
 
-    def get_slurm_job_info(self, job_id: int) -> SlurmJobInfo:
-        assert job_id > 0
+    def get_slurm_job_infos(self, job_ids: Iterable[int]) -> dict[int, SlurmJobInfo]:
+        """Retrieves info on several jobs with as few sacct calls as possible, job steps are skipped"""
         logger = log.get_logger()
+        job_infos: dict[int, SlurmJobInfo] = {}
         try:
-            cmd =  f"sacct --format=JobID%-15,JobName%-20,Partition%-15,User%-20,Account%-20,NNodes%-10,State%-30,ExitCode%-15 --jobs={job_id} --noheader"
-            bout, berr = wexec(cmd)
-            job_infos = self.parse_sacct_output(bout)
-            return job_infos[0]
+            for chunk in chunked(job_ids):
+                cmd = f"{self.execs.sacct} --format=JobID%-15,JobName%-20,Partition%-15,User%-20,Account%-20,NNodes%-10,State%-30,ExitCode%-15 --jobs={','.join(map(str, chunk))} --allocations --noheader"
+                bout, berr = wexec(cmd)
+                for job_info in self.parse_sacct_output(bout):
+                    if job_info.job_id.isdigit():
+                        job_infos[int(job_info.job_id)] = job_info
 
         except subprocess.CalledProcessError as e:
             logger.error(f"An error occurred while retrieving job info: {e}")
             logger.exception(e)
             raise
+        return job_infos
+
+    def get_slurm_job_info(self, job_id: int) -> SlurmJobInfo:
+        assert job_id > 0
+        return self.get_slurm_job_infos([job_id])[job_id]
 
     def perform_check(self) -> None:
-        cmd = f"{self.execs.sacct} -j {self.jobid} -n -p -o jobid,state"
-        bout, berr = wexec(cmd)
-        for line in bout.splitlines():
-            if re.match(r"^\d+\|[a-zA-Z]+\|$", line):
-                self.state = SStates(line.split("|")[1])
-                return
-        self.state = SStates.UNKNOWN_STATE
+        assert self.jobid is not None
+        self.state = job_state_cache.get(self.jobid, max(self.every - 1, 1), self.execs, self.only_job_state)
+
+    def perform_check_many(self, jobids: list[int]) -> dict[int, SStates]:
+        """Queries states of several jobs with as few sacct calls as possible"""
+        return sacct_states(self.execs.sacct, jobids)
 
     def ok(self) -> None:
         self.__ok = True
@@ -360,74 +481,236 @@ class Poller:
 
     def inform_user(self, message: str):
         try:
-            user = os.environ['user']
-            bout, berr = wexec('who')
-            ttys = [line.split()[1] for line in bout.splitlines() if line.startswith(user)]
-            ttys = [f"/dev/{tty}" for tty in ttys]
-            for tty in ttys:
-                with open(tty, 'w') as term:
-                    term.write(f"\n{message}\n")
-        except Exception as e:
+            ttys = _user_ttys(int(time.time() // 60))
+        except Exception:
+            return
+        data = f"\n{message}\n".encode()
+        for tty in ttys:
+            try:
+                fd = _terminals.get(tty)
+                if fd is None:
+                    # O_NOCTTY: spolld is a session leader, opening a tty must not make it our controlling terminal
+                    fd = _terminals[tty] = os.open(tty, os.O_WRONLY | os.O_NOCTTY | os.O_NONBLOCK | os.O_CLOEXEC)
+                os.write(fd, data)
+            except BlockingIOError:
+                # terminal output is stalled, drop the message rather than block the loop
+                pass
+            except OSError:
+                fd = _terminals.pop(tty, None)
+                if fd is not None:
+                    try:
+                        os.close(fd)
+                    except OSError:
+                        pass
+
+    def wake(self, *_) -> None:
+        """Interrupts current sleep of the main loop, so the next check happens immediately. Safe to call from signal handler"""
+        try:
+            os.write(self.__wake_w, b"\0")
+        except (BlockingIOError, OSError):
             pass
 
-    def __loop(self) -> bool:
+    def stop(self, *_) -> None:
+        """Asks the main loop to exit as soon as possible. Safe to call from signal handler"""
+        self.__stop = True
+        self.wake()
+
+    def __sleep(self, timeout: float) -> None:
+        fds = [fd for fd in (self.__wake_r, self.__trigger_r, self.__watch_fd) if fd >= 0]
+        deadline = time.monotonic() + timeout
+        while True:
+            readable, _, _ = select.select(fds, [], [], max(deadline - time.monotonic(), 0))
+            if not readable:
+                return
+            woken = False
+            for fd in readable:
+                if fd == self.__watch_fd:
+                    # other files in the watched directory are of no interest
+                    woken |= self.__watch_path.name in inotify_read_names(fd)
+                    continue
+                try:
+                    while os.read(fd, 512):
+                        pass
+                except BlockingIOError:
+                    pass
+                woken = True
+            if woken:
+                # woken up by signal, strigger or watched file, cached state is likely outdated
+                job_state_cache.invalidate()
+                return
+
+    def __set_watch(self) -> None:
+        logger = log.get_logger()
+        assert self.watch_path is not None
+        self.__watch_path = self.cwd / self.watch_path
+        try:
+            self.__watch_fd = inotify_watch(self.__watch_path.parent, inotify_events[self.watch_event])
+        except (OSError, AttributeError) as e:
+            logger.warning(f"Unable to watch {self.__watch_path.as_posix()}: {e}. Relying on periodic checks only")
+            return
+        logger.debug(f"Watching {self.__watch_path.as_posix()} for {self.watch_event}")
+
+    def __clear_watch(self) -> None:
+        if self.__watch_fd >= 0:
+            os.close(self.__watch_fd)
+        self.__watch_fd = -1
+
+    @property
+    def trigger_fifo(self) -> Path:
+        return self.cwd / f"{self.jobid}.trigger.fifo"
+
+    def __set_trigger(self) -> None:
+        """Asks slurmctld to write to a fifo when job finishes, so the loop wakes up without waiting for the next tick.
+        strigger programs run on slurmctld host, so this is only useful when spolld runs there too"""
         logger = log.get_logger()
-        last_state = self.state
-        last_state_times: int = 0
+        fifo = self.trigger_fifo
+        script = fifo.with_suffix(".sh")
+        try:
+            fifo.unlink(missing_ok=True)
+            os.mkfifo(fifo, 0o600)
+            self.__trigger_r = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+            # dummy writer: without any writer select() would report the fifo readable (EOF) all the time
+            self.__trigger_w = os.open(fifo, os.O_WRONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+            script.write_text(f"#!/bin/sh\necho done > {shlex.quote(fifo.as_posix())}\n")
+            script.chmod(0o700)
+            wexec(f"{self.execs.strigger} --set --jobid={self.jobid} --fini --program={shlex.quote(script.as_posix())}")
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.warning(f"Unable to set strigger: {e}. Relying on periodic checks only")
+            self.__clear_trigger()
+            return
+        self.__trigger_set = True
+        logger.debug(f"Set strigger on job {self.jobid} finish")
 
-        logger.info("Started main loop")
+    def __clear_trigger(self) -> None:
+        logger = log.get_logger()
+        if self.__trigger_set:
+            try:
+                wexec(f"{self.execs.strigger} --clear --jobid={self.jobid}")
+            except subprocess.CalledProcessError:
+                logger.warning("Unable to clear strigger")
+            self.__trigger_set = False
+        for fd in (self.__trigger_r, self.__trigger_w):
+            if fd >= 0:
+                os.close(fd)
+        self.__trigger_r = self.__trigger_w = -1
+        self.trigger_fifo.unlink(missing_ok=True)
+        self.trigger_fifo.with_suffix(".sh").unlink(missing_ok=True)
+
+    def __handle_end(self, logger: logging.Logger) -> bool | None:
+        logger.info(f"Reached end state: {str(self.state)}. Exiting loop")
+        self.ok()
+        self.inform_user(f"spoll (PID: {os.getpid()}, jobid: {self.jobid}) reached end state, cwd: {self.cwd.as_posix()}")
+        return True
+
+    def __handle_failure(self, logger: logging.Logger) -> bool | None:
+        logger.error(f"Something went wrong with slurm job. State: {str(self.state)} Exiting...")
+        self.ok()
+        self.inform_user(f"spoll (PID: {os.getpid()}, jobid: {self.jobid}) Something went wrong with slurm job. State: {str(self.state)}. cwd: {self.cwd.as_posix()}")
+        return False
+
+    def __handle_pending(self, logger: logging.Logger) -> bool | None:
+        logger.info("Pending...")
+        return None
+
+    def __handle_running(self, logger: logging.Logger) -> bool | None:
+        self.__last_state = self.state
+        self.__last_state_times = 0
+        logger.info("RUNNING")
+        return None
+
+    def __handle_strange(self, logger: logging.Logger) -> bool | None:
+        if self.state == self.__last_state:
+            self.__last_state_times += 1
+            if self.__last_state_times > self.times_criteria:
+                logger.error(f"State {self.state} was too long (>{self.times_criteria} times). Exiting...")
+                self.inform_user(f"spoll (PID: {os.getpid()}, jobid: {self.jobid}) State {self.state} was too long, cwd: {self.cwd.as_posix()}")
+                self.ok()
+                return False
+            else: logger.info(f"State {self.state} still for {self.times_criteria} times")
+        else:
+            self.__last_state = self.state
+            self.__last_state_times = 0
+            logger.warning(f"Strange state {self.state} encountered")
+        return None
 
+    def __loop(self) -> bool:
+        logger = log.get_logger()
+        self.__last_state = self.state
+        self.__last_state_times = 0
+
+        handlers: dict[SStates, Callable[[logging.Logger], bool | None]] = {
+            **{state: self.__handle_end for state in states_to_end},
+            **{state: self.__handle_failure for state in failure_states},
+            SStates.PENDING: self.__handle_pending,
+            SStates.RUNNING: self.__handle_running,
+        }
+
+        interval = float(self.every)
+        max_interval = float(self.every * backoff_cap)
+        retry_interval = float(self.every)
+
+        prev_handler = signal.getsignal(signal.SIGUSR1)
+        prev_term_handler = signal.getsignal(signal.SIGTERM)
         try:
+            # self-pipe instead of threading.Event: Event.set() takes a lock, which is unsafe in a signal handler
+            self.__wake_r, self.__wake_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+            signal.signal(signal.SIGUSR1, self.wake)
+            signal.signal(signal.SIGTERM, self.stop)
+            if self.use_strigger:
+                self.__set_trigger()
+            if self.watch_path is not None:
+                self.__set_watch()
+
+            logger.info("Started main loop")
+
             while True:
-                time.sleep(self.every)
+                # jitter keeps many pollers from hitting slurm in lockstep
+                self.__sleep(interval + random.uniform(0, 1))
+                if self.__stop:
+                    logger.warning("Termination requested, exiting loop")
+                    return False
                 logger.info("Checking job")
+                prev_state = self.state
                 try:
                     self.perform_check()
                 except Exception as e:
+                    retry_interval *= 2
+                    if retry_interval <= max_interval:
+                        interval = retry_interval
+                        logger.warning(f"Check failed due to exception: {e!r}. Retrying in {interval:.0f} seconds")
+                        continue
                     logger.critical("Check failed due to exception:")
                     logger.exception(e)
                     self.inform_user(f"spoll (PID: {os.getpid()}, jobid: {self.jobid}) check failed due to exception, cwd: {self.cwd.as_posix()}")
                     raise
+                retry_interval = float(self.every)
                 logger.info(f"Job state: {str(self.state)}")
 
-                if self.state in states_to_end:
-                    logger.info(f"Reached end state: {str(self.state)}. Exiting loop")
-                    self.ok()
-                    self.inform_user(f"spoll (PID: {os.getpid()}, jobid: {self.jobid}) reached end state, cwd: {self.cwd.as_posix()}")
-                    return True
-                elif self.state in failure_states:
-                    logger.error(f"Something went wrong with slurm job. State: {str(self.state)} Exiting...")
-                    self.ok()
-                    self.inform_user(f"spoll (PID: {os.getpid()}, jobid: {self.jobid}) Something went wrong with slurm job. State: {str(self.state)}. cwd: {self.cwd.as_posix()}")
-                    return False
-                # elif self.state == SStates.UNKNOWN_STATE:
-                #     logger.error(f"Unknown slurm job state. Exiting...")
-                #     self.ok()
-                #     return False
-                elif self.state == SStates.PENDING:
-                    logger.info("Pending...")
-                elif self.state == SStates.RUNNING:
-                    last_state = self.state
-                    last_state_times = 0
-                    logger.info("RUNNING")
-                else:  # state != SStates.RUNNING:
-                    if self.state == last_state:
-                        last_state_times += 1
-                        if last_state_times > self.times_criteria:
-                            logger.error(f"State {self.state} was too long (>{self.times_criteria} times). Exiting...")
-                            self.inform_user(f"spoll (PID: {os.getpid()}, jobid: {self.jobid}) State {self.state} was too long, cwd: {self.cwd.as_posix()}")
-                            self.ok()
-                            return False
-                        else: logger.info(f"State {self.state} still for {self.times_criteria} times")
-                    else:
-                        last_state = self.state
-                        last_state_times = 0
-                        logger.warning(f"Strange state {self.state} encountered")
+                factor = backoff_factors.get(self.state)
+                if self.state == prev_state and factor is not None:
+                    interval = min(interval * factor, max_interval)
+                else:
+                    interval = float(self.every)
+
+                result = handlers.get(self.state, self.__handle_strange)(logger)
+                if result is not None:
+                    return result
 
         except Exception as e:
             logger.critical("Uncaught exception")
             logger.exception(e)
             return False
+        finally:
+            if self.use_strigger:
+                self.__clear_trigger()
+            self.__clear_watch()
+            _close_terminals()
+            signal.signal(signal.SIGUSR1, prev_handler)
+            signal.signal(signal.SIGTERM, prev_term_handler)
+            for fd in (self.__wake_r, self.__wake_w):
+                if fd >= 0:
+                    os.close(fd)
+            self.__wake_r = self.__wake_w = -1
 
 
 def main() -> int:
@@ -6,24 +6,26 @@
 # This software is released under the MIT License.
 # https://opensource.org/licenses/MIT
 
-# Last modified: 26-10-2024 09:32:44
+# Last modified: 16-10-2026 02:44:09
 
 import re
 import sys
+import time
 import argparse
 from typing import Any
 from pathlib import Path
+from functools import lru_cache
 from dataclasses import dataclass
 
-import toml
-from marshmallow import Schema, fields, post_load, validates, ValidationError
+from marshmallow import Schema, fields, post_load
 
-from .utils import ranges, wexec, parse_nodes, parse_timelimit, FieldPath, log
+from .utils import ranges, wexec, parse_nodes, parse_timelimit, load_toml, FieldPath, log
 from .execs import CMDSchema, Execs, ExecsSchema, CMD
 from .polling import Poller
 
 
-regex_sbatch_jobid = r'Submitted batch jobid (\d+)'
+regex_sbatch_jobid = re.compile(r'Submitted batch job (\d+)')
+sinfo_ttl: int = 30  # seconds for which sinfo output is reused
 
 
 @dataclass
@@ -62,11 +64,10 @@ class Options:
 
     @property
     def job_folder_rel(self) -> str:
-        bd = Path()
         if self.job_number is None:
-            return (bd / self.folder / f"{self.job_name}").relative_to(bd).as_posix()
+            return (Path(self.folder) / f"{self.job_name}").as_posix()
         else:
-            return (bd / self.folder / f"{self.job_name}_{self.job_number}").relative_to(bd).as_posix()
+            return (Path(self.folder) / f"{self.job_name}_{self.job_number}").as_posix()
 
     def job_folder(self, cwd: Path) -> Path:
         return cwd / self.job_folder_rel
@@ -87,7 +88,7 @@ class OptionsSchema(Schema):
         return Options(**data)
 
 
-@dataclass
+@dataclass(slots=True)
 class Node:
     name: str
     idx: int
@@ -97,120 +98,149 @@ class Node:
 
     @classmethod
     def from_string(cls, string: str):
-        instance = cls.__new__(cls)
+        name, idx_str = string.rsplit('_', 1)
+        return cls(name, int(idx_str))
+
 
-        name, idx_str = string.split('_')
-        instance.name = name
-        instance.idx = int(idx_str)
-        return instance
+@lru_cache(maxsize=4)
+def _sinfo_snapshot(sinfo: str, ttl_bucket: int) -> str:
+    cmd = f"{sinfo} -h --hide -o %P|%l|%N"
+    bout, berr = wexec(cmd)
+    return bout
 
 
 class Platform:
-    execs: Execs = Execs()
-    usr_nodes_include: dict[str, list[int]] = {}
-    usr_nodes_exclude: dict[str, list[int]] = {}
-    nodes_include: dict[str, set[int]] = {}
-    nodes_exclude: dict[str, set[int]] = {}
-    nodelist: dict[str, set[int]] = {}
-    partitions: set[str] = set()
-
-    def __init__(self, execs: Execs = Execs(), nodes_include: dict[str, list[int]] = {}, nodes_exclude: dict[str, list[int]] = {}) -> None:
+    execs: Execs
+    usr_nodes_include: dict[str, list[int]]
+    usr_nodes_exclude: dict[str, list[int]]
+    nodes_include: dict[str, set[int]]
+    nodes_exclude: dict[str, set[int]]
+    nodelist: dict[str, set[int]]
+    partitions: set[str]
+    timelimits: dict[str, str]
+    __update_key: tuple[int, str, str, str] | None
+
+    def __init__(self, execs: Execs | None = None, nodes_include: dict[str, list[int]] | None = None, nodes_exclude: dict[str, list[int]] | None = None) -> None:
         super().__init__()
-        self.execs = execs
-        self.usr_nodes_exclude = nodes_exclude
-        self.usr_nodes_include = nodes_include
+        self.execs = Execs() if execs is None else execs
+        self.usr_nodes_exclude = {} if nodes_exclude is None else nodes_exclude
+        self.usr_nodes_include = {} if nodes_include is None else nodes_include
+        self.nodes_include = {}
+        self.nodes_exclude = {}
+        self.nodelist = {}
+        self.partitions = set()
+        self.timelimits = {}
+        self.__update_key = None
 
     def update(self, strict: bool) -> bool:
         logger = log.get_logger()
-        if not self.execs.check(strict):
+        if not self.execs.check(strict, ("sinfo", "sbatch")):
             logger.error("Could not find some executables")
+            self.__update_key = None
             return False
 
-        logger.debug("Getting nodelist")
-        self.nodelist = self.get_nodelist()
-        logger.info(f"Following nodes were found: {self.nodelist}")
+        # same sinfo snapshot and same user lists give the same result, skip recomputation.
+        # Computed after execs.check, which replaces sinfo with its resolved path
+        key = (int(time.time() // sinfo_ttl), self.execs.sinfo, repr(self.usr_nodes_include), repr(self.usr_nodes_exclude))
+        if key == self.__update_key:
+            logger.debug("Platform is up to date")
+            return True
+        self.__update_key = None
 
-        logger.debug("Getting partitions list")
-        self.partitions = self.get_partitions()
+        logger.debug("Getting nodelist and partitions list")
+        self.nodelist, self.partitions, self.timelimits = self.get_info()
+        logger.info(f"Following nodes were found: {self.nodelist}")
         logger.info(f"Following partitions were found: {self.partitions}")
 
-        long_usr_nodes_include: set = set()
-        for name, ids in self.usr_nodes_include.items():
-            if isinstance(ids, int):
-                long_usr_nodes_include.update({Node(name, id).stringify() for id in self.nodelist[name]})
-            else:
-                long_usr_nodes_include.update({Node(name, id).stringify() for id in ids})
-
-        long_usr_nodes_exclude: set = set()
-        for name, ids in self.usr_nodes_exclude.items():
-            if isinstance(ids, int):
-                long_usr_nodes_exclude.update({Node(name, id).stringify() for id in self.nodelist[name]})
-            else:
-                long_usr_nodes_exclude.update({Node(name, id).stringify() for id in ids})
+        if len(self.usr_nodes_include) == 0 and len(self.usr_nodes_exclude) == 0:
+            logger.info("No include or exclude nodelists, using all nodes")
+            self.nodes_include = {name: set(ids) for name, ids in self.nodelist.items() if len(ids) != 0}
+            self.nodes_exclude = {}
+            if len(self.nodes_include) == 0:
+                logger.error("No nodes left to run on. Check your excludes and includes")
+                return False
+            self.__update_key = key
+            return True
 
-        long_nodelist: set = set()
-        for name, ids in self.nodelist.items():
-            long_nodelist.update({Node(name, id).stringify() for id in ids})
+        include = self.__expand(self.usr_nodes_include)
+        exclude = self.__expand(self.usr_nodes_exclude)
 
-        was_empty = len(long_usr_nodes_include) == 0
+        was_empty = all(len(ids) == 0 for ids in include.values())
 
-        nonexistent = (long_usr_nodes_include - long_nodelist) | (long_usr_nodes_exclude - long_nodelist)
+        nonexistent: dict[str, set[int]] = {}
+        for nodes in (include, exclude):
+            for name, ids in nodes.items():
+                missing = ids - self.nodelist.get(name, set())
+                if len(missing) != 0:
+                    nonexistent.setdefault(name, set()).update(missing)
+                    ids.difference_update(missing)
         if len(nonexistent) != 0:
             logger.info(f"Nonexistent nodes found in configuration: {nonexistent}")
-            long_usr_nodes_include.difference_update(nonexistent)
-            long_usr_nodes_exclude.difference_update(nonexistent)
-        if len(long_usr_nodes_include & long_usr_nodes_exclude) != 0:
-            logger.error(f"There were nodes both in include and exclude lists: {long_usr_nodes_include & long_usr_nodes_exclude}")
+
+        both = {name: include[name] & exclude[name] for name in include.keys() & exclude.keys()}
+        both = {name: ids for name, ids in both.items() if len(ids) != 0}
+        if len(both) != 0:
+            logger.error(f"There were nodes both in include and exclude lists: {both}")
             return False
 
         if was_empty:
             logger.info(f"Include nodelist is empty, asumming use all, except exlude nodelist")
-            long_usr_nodes_include = long_nodelist
-            long_usr_nodes_include.difference_update(long_usr_nodes_exclude)
+            include = {name: ids - exclude.get(name, set()) for name, ids in self.nodelist.items()}
 
-        long_usr_nodes_exclude = long_nodelist - long_usr_nodes_include
+        exclude = {name: ids - include.get(name, set()) for name, ids in self.nodelist.items()}
 
-        if len(long_usr_nodes_include) == 0:
+        self.nodes_include = {name: ids for name, ids in include.items() if len(ids) != 0}
+        self.nodes_exclude = {name: ids for name, ids in exclude.items() if len(ids) != 0}
+
+        if len(self.nodes_include) == 0:
             logger.error("No nodes left to run on. Check your excludes and includes")
             return False
 
-        self.nodes_include = {}
-        for node_str in long_usr_nodes_include:
-            _node = Node.from_string(node_str)
-            if _node.name not in self.nodes_include:
-                self.nodes_include[_node.name] = set()
-            self.nodes_include[_node.name].add(_node.idx)
-
-        self.nodes_exclude = {}
-        for node_str in long_usr_nodes_exclude:
-            _node = Node.from_string(node_str)
-            if _node.name not in self.nodes_exclude:
-                self.nodes_exclude[_node.name] = set()
-            self.nodes_exclude[_node.name].add(_node.idx)
-
+        self.__update_key = key
         return True
 
-    def get_nodelist(self) -> dict[str, set[int]]:
-        cmd = f"{self.execs.sinfo} -h --hide -o %N"
-        bout, berr = wexec(cmd)
+    def __expand(self, usr_nodes: dict[str, list[int]]) -> dict[str, set[int]]:
+        expanded: dict[str, set[int]] = {}
+        for name, ids in usr_nodes.items():
+            if isinstance(ids, int):
+                expanded[name] = set(self.nodelist.get(name, set()))
+            else:
+                expanded[name] = set(ids)
+        return expanded
+
+    def get_info(self) -> tuple[dict[str, set[int]], set[str], dict[str, str]]:
+        bout = _sinfo_snapshot(self.execs.sinfo, int(time.time() // sinfo_ttl))
+        nodelist: dict[str, set[int]] = {}
+        partitions: set[str] = set()
+        timelimits: dict[str, str] = {}
+        for line in bout.splitlines():
+            partition, _, rest = line.partition('|')
+            limit, _, nodes = rest.partition('|')
+            partition = partition.strip().replace("*", "")
+            partitions.add(partition)
+            timelimits[partition] = limit.strip()
+            if nodes.strip() == "":
+                continue
+            for name, ids in parse_nodes(nodes.strip()).items():
+                nodelist.setdefault(name, set()).update(ids)
+
+        return nodelist, partitions, timelimits
 
-        return parse_nodes(bout)
+    def get_nodelist(self) -> dict[str, set[int]]:
+        return self.get_info()[0]
 
     def get_partitions(self) -> set[str]:
-        cmd = f"{self.execs.sinfo} -h --hide -o %P"
-        bout, berr = wexec(cmd)
-        partitions = []
-        for el in bout.split():
-            partitions.append(el.replace("*", ""))
-
-        return set(partitions)
+        return self.get_info()[1]
 
     def get_timelimit(self, partition: str) -> int:
-        cmd = f"{self.execs.sinfo} -o '%P %l' --partition={partition}"
-        bout, berr = wexec(cmd)
+        if partition in self.timelimits:
+            bout = self.timelimits[partition]
+        else:
+            cmd = f"{self.execs.sinfo} -h -o %l --partition={partition}"
+            bout, berr = wexec(cmd)
 
         try:
-            s = bout.splitlines()[1]
+            s = bout.splitlines()[0].strip()
             limit = parse_timelimit(s)
             return limit
         except Exception as e:
@@ -221,28 +251,25 @@ class Platform:
 
     @property
     def exclude_str(self):
-        s = ""
+        parts: list[str] = []
         for k, v in self.nodes_exclude.items():
-            for a, b in ranges(v):
-                if a == b:
-                    s += f"{k}{a},"
-                else:
-                    s += f"{k}[{a}-{b}],"
-        return s[:-1]
+            for a, b in ranges(sorted(v)):
+                parts.append(f"{k}{a}" if a == b else f"{k}[{a}-{b}]")
+        return ",".join(parts)
 
     @classmethod
     def from_schema(cls, data: dict[str, Any], immidiate_update: bool = False, strict: bool = False):
-        schema = PlatformSchema()
+        schema = _platform_schema
         platform = schema.load(data)
-        if not isinstance(platform, Platform):
-            raise ValueError("")
+        assert isinstance(platform, Platform)
         if immidiate_update:
             if not platform.update(strict):
                 raise RuntimeError("")
+        return platform
 
 
 class PlatformSchema(Schema):
-    execs = fields.Nested(ExecsSchema, missing=Execs())
+    execs = fields.Nested(ExecsSchema, missing=Execs)
     nodes_include_dump = fields.Dict(
         keys=fields.Str(),
         values=fields.List(fields.Int()),
@@ -285,37 +312,20 @@ class PlatformSchema(Schema):
     def make_platform_conf(self, data, **kwargs):
         return Platform(**data)
 
-    @validates('nodes_include_load')
-    def validate_usr_nodes_include(self, value: dict[str, list[int]]):
-        for key, node_list in value.items():
-            if not isinstance(key, str):
-                raise ValidationError("All keys must be strings.")
-            if not isinstance(node_list, list):
-                raise ValidationError(f"Value for key '{key}' must be a list of integers.")
-            if not all(isinstance(node, int) for node in node_list):
-                raise ValidationError(f"All node IDs in '{key}' must be integers.")
-
-    @validates('nodes_exclude_load')
-    def validate_usr_nodes_exclude(self, value: dict[str, list[int]]):
-        for key, node_list in value.items():
-            if not isinstance(key, str):
-                raise ValidationError("All keys must be strings.")
-            if not isinstance(node_list, list):
-                raise ValidationError(f"Value for key '{key}' must be a list of integers.")
-            if not all(isinstance(node, int) for node in node_list):
-                raise ValidationError(f"All node IDs in '{key}' must be integers.")
+
+_platform_schema = PlatformSchema()
 
 
 class Sbatch:
-    options: Options = Options()
-    platform: Platform = Platform()
+    options: Options
+    platform: Platform
     cwd: Path
 
-    def __init__(self, options: Options = Options(), platform: Platform = Platform(), cwd: Path = Path.cwd()) -> None:
+    def __init__(self, options: Options | None = None, platform: Platform | None = None, cwd: Path | None = None) -> None:
         super().__init__()
-        self.options = options
-        self.platform = platform
-        self.cwd = cwd
+        self.options = Options() if options is None else options
+        self.platform = Platform() if platform is None else platform
+        self.cwd = Path.cwd() if cwd is None else cwd
 
     def check(self, strict: bool) -> bool:
         logger = log.get_logger()
@@ -349,7 +359,8 @@ class Sbatch:
         if not self.check(True):
             raise RuntimeError("Configuration check failed")
 
-        tdir = self.options.job_folder(self.cwd)
+        job_folder_rel = self.options.job_folder_rel
+        tdir = self.cwd / job_folder_rel
         tdir.mkdir(parents=True, exist_ok=True)
 
         job_file = tdir / f"{self.options.job_name}.job"
@@ -366,51 +377,50 @@ class Sbatch:
                     debug=True,
                     logto='file',
                     tag=self.options.tag,
-                    logfolder=self.options.job_folder_rel,
+                    logfolder=job_folder_rel,
                     lockfilename=f"{self.options.tag}.lock" if self.options.tag is not None else None,
                     cwd=self.cwd,
                     execs=self.platform.execs,
+                    # slurm closes job's stdout when it ends
+                    watch_path=f"{job_folder_rel}/{self.options.job_name}.out",
                 )
             poller.check(False)
 
-        with job_file.open('w') as fh:
-            fh.writelines("#!/usr/bin/env bash\n")
-            fh.writelines(f"#SBATCH --job-name={self.options.job_name}\n")
-            fh.writelines(f"#SBATCH --output={tdir}/{self.options.job_name}.out\n")
-            fh.writelines(f"#SBATCH --error={tdir}/{self.options.job_name}.err\n")
-            fh.writelines("#SBATCH --begin=now\n")
-            if self.options.nnodes is not None:
-                fh.writelines(f"#SBATCH --nodes={self.options.nnodes}\n")
-            if self.options.ntasks_per_node is not None:
-                fh.writelines(f"#SBATCH --ntasks-per-node={self.options.ntasks_per_node}\n")
-            if self.options.partition is not None:
-                fh.writelines(f"#SBATCH --partition={self.options.partition}\n")
-            if len(self.platform.nodes_exclude) != 0:
-                fh.writelines(f"#SBATCH --exclude={self.platform.exclude_str}\n")
-            assert self.options.cmd is not None
-            if self.options.cmd.preload == "":
-                fh.writelines(f"srun -u {self.options.cmd.executable} {self.options.cmd.args}")
-            else:
-                fh.writelines(f"{self.options.cmd.preload} srun -u {self.options.cmd.executable} {self.options.cmd.args}")
+        lines = [
+            "#!/usr/bin/env bash\n",
+            f"#SBATCH --job-name={self.options.job_name}\n",
+            f"#SBATCH --output={tdir}/{self.options.job_name}.out\n",
+            f"#SBATCH --error={tdir}/{self.options.job_name}.err\n",
+            "#SBATCH --begin=now\n",
+        ]
+        if self.options.nnodes is not None:
+            lines.append(f"#SBATCH --nodes={self.options.nnodes}\n")
+        if self.options.ntasks_per_node is not None:
+            lines.append(f"#SBATCH --ntasks-per-node={self.options.ntasks_per_node}\n")
+        if self.options.partition is not None:
+            lines.append(f"#SBATCH --partition={self.options.partition}\n")
+        if len(self.platform.nodes_exclude) != 0:
+            lines.append(f"#SBATCH --exclude={self.platform.exclude_str}\n")
+        assert self.options.cmd is not None
+        if self.options.cmd.preload == "":
+            lines.append(f"srun -u {self.options.cmd.executable} {self.options.cmd.args}")
+        else:
+            lines.append(f"{self.options.cmd.preload} srun -u {self.options.cmd.executable} {self.options.cmd.args}")
+
+        job_file.write_text("".join(lines))
 
         logger.info("Submitting task...")
         cmd = f"{self.platform.execs.sbatch} {job_file}"
         bout, berr = wexec(cmd)
 
-        if re.match(r'Submitted batch job \d+', bout):
-            try:
-                jobid = int(bout.split()[-1])
-            except ValueError as e:
-                logger.error("Cannot parse sbatch jobid from:")
-                logger.error(bout)
-                logger.exception(e)
-                raise RuntimeError("sbatch command not returned task jobid")
-            print("Sbatch jobid: ", jobid)
-            logger.info(f"Sbatch jobid: {jobid}")
-        else:
+        match = regex_sbatch_jobid.search(bout)
+        if match is None:
             logger.error("Cannot parse sbatch jobid from:")
             logger.error(bout)
             raise RuntimeError("sbatch command not returned task jobid")
+        jobid = int(match.group(1))
+        print("Sbatch jobid: ", jobid)
+        logger.info(f"Sbatch jobid: {jobid}")
 
         if run_poll:
             assert poller is not None
@@ -423,10 +433,8 @@ class Sbatch:
 
     @classmethod
     def from_schema(cls, data: dict[str, Any], immidiate_check: bool = False, strict: bool = False):
-        schema = SbatchSchema()
-        sbatch = schema.load(data)
-        if not isinstance(sbatch, Sbatch):
-            raise ValueError("")
+        sbatch = _sbatch_schema.load(data)
+        assert isinstance(sbatch, Sbatch)
         if immidiate_check:
             if not sbatch.check(strict):
                 raise RuntimeError("")
@@ -436,13 +444,15 @@ class Sbatch:
 class SbatchSchema(Schema):
     options = fields.Nested(OptionsSchema)
     platform = fields.Nested(PlatformSchema)
-    cwd = FieldPath(missing=Path.cwd(), default=Path.cwd())
+    cwd = FieldPath(missing=Path.cwd, default=Path.cwd)
 
     @post_load
     def make_sbatch(self, data, **kwargs):
         return Sbatch(**data)
 
 
+_sbatch_schema = SbatchSchema()
+
 def_conf_name: str = "sbatch.toml"
 
 
@@ -479,15 +489,15 @@ def main():
             ),
             cwd=cwd
         )
-        _d = SbatchSchema().dump(sb)
+        _d = _sbatch_schema.dump(sb)
         assert isinstance(_d, dict)
         d = _d
+        import toml
         with conffile.open('w') as fp:
             toml.dump(d, fp)
 
     if args.checkconf:
-        with conffile.open('r') as fp:
-            d: dict[str, Any] = toml.load(fp)
+        d = load_toml(conffile)
         sbatch = Sbatch.from_schema(d)
         sbatch.check(args.strict)
 
@@ -6,19 +6,22 @@
 # This software is released under the MIT License.
 # https://opensource.org/licenses/MIT
 
-# Last modified: 26-10-2024 09:32:44
+# Last modified: 16-10-2026 02:44:12
 
 import os
-import re
 import sys
+import copy
 import shlex
+import ctypes
 import shutil
-import inspect
+import struct
 import logging
+import tomllib
 import itertools
 import subprocess
 from pathlib import Path
-from typing import Union, Literal
+from functools import lru_cache
+from typing import Any, Union, Literal
 
 from marshmallow import fields
 
@@ -40,8 +43,12 @@ def minilog(name: str) -> logging.Logger:
 
 
 def get_call_stack(fname: str | None = None, skip: int = 0, skip_after: int = 0):
-    stack = inspect.stack()
-    func_list = [frame.function for frame in stack[1+skip:-1-skip_after]]
+    names = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        names.append(frame.f_code.co_name)
+        frame = frame.f_back
+    func_list = names[skip:-1-skip_after]
     s = ".".join(reversed(func_list))
     if fname is not None:
         s += f".{fname}"
@@ -59,14 +66,18 @@ class UpperLevelFilter(logging.Filter):
 
 log2type = Literal["file", "screen", "both", "off"]
 log2list: list[log2type] = ["file", "screen", "both", "off"]
+log2file: frozenset[log2type] = frozenset(("file", "both"))
+log2screen: frozenset[log2type] = frozenset(("screen", "both"))
 
 
 class LogDaemon:
     __logger: logging.Logger
+    __children: dict[str, logging.Logger]
     __initalized: bool = False
 
     def __init__(self) -> None:
         self.__logger = logging.getLogger("pysbatch")
+        self.__children = {}
 
     def configure(self, logto: log2type, logfile: Path | None = None, debug: bool = True):
         if self.__initalized:
@@ -77,14 +88,14 @@ class LogDaemon:
 
         formatter: logging.Formatter = logging.Formatter('%(asctime)s:%(levelname)s:%(name)s: %(message)s')
 
-        if logto == 'file' or logto == 'both':
+        if logto in log2file:
             if logfile is None:
                 raise ValueError("Logfile is not specified")
             FileHandler = logging.FileHandler(logfile)
             FileHandler.setFormatter(formatter)
             FileHandler.setLevel(logging.DEBUG)
             self.__logger.addHandler(FileHandler)
-        if logto == 'screen' or logto == 'both':
+        if logto in log2screen:
             soutHandler = logging.StreamHandler(stream=sys.stdout)
             soutHandler.setLevel(logging.DEBUG)
             soutHandler.setFormatter(formatter)
@@ -103,7 +114,12 @@ class LogDaemon:
     def get_logger(self):
         if not self.__initalized:
             raise RuntimeError("pysbatch logger is not configured. Do it by calling pysbatch.log.configure()")
-        return self.__logger.getChild(get_call_stack(skip=1, skip_after=1))
+        name = get_call_stack(skip=1, skip_after=1)
+        # getChild goes through logging's global lock, cached child saves it on every call from loops
+        child = self.__children.get(name)
+        if child is None:
+            child = self.__children[name] = self.__logger.getChild(name)
+        return child
 
 
 log = LogDaemon()
@@ -128,62 +144,119 @@ def ranges_as_list(i):
 
 
 def parse_timelimit(limit_str: str) -> int:
-    logger = log.get_logger()
-    if limit_str == "UNLIMITED":
+    parts = limit_str.split()
+    if len(parts) not in (1, 2):
+        raise RuntimeError(f"Time limit retrieved does not match expected format: {limit_str}")
+    value = parts[-1]  # optionally preceded by partition name
+    if value in ("UNLIMITED", "infinite"):
         return -1
+
+    days_str, sep, hms = value.rpartition('-')
+    hms_parts = hms.split(':')
+    well_formed = (
+        (not sep or days_str.isdigit())
+        and len(hms_parts) in (2, 3)
+        and all(part.isdigit() for part in hms_parts)
+        and len(hms_parts[0]) <= 2
+        and all(len(part) == 2 for part in hms_parts[1:])
+    )
+    if not well_formed:
+        raise RuntimeError(f"Time limit retrieved does not match expected format: {limit_str}")
+
+    days = int(days_str) if sep else 0
+    hours = int(hms_parts[0])
+    minutes = int(hms_parts[1])
+    seconds = int(hms_parts[2]) if len(hms_parts) == 3 else 0
+
+    if 0 <= hours <= 23 and 0 <= minutes <= 59 and 0 <= seconds <= 59:
+        return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
     else:
-        pattern = r"^[a-zA-Z\*]*\s+(?:(\d+)-)?(\d{1,2}):(\d{2}):?(?:(\d{2}))?$"
-        match = re.match(pattern, limit_str)
-        if match:
-            days = int(match.group(1)) if match.group(1) else 0
-            hours = int(match.group(2)) if match.group(2) else 0
-            minutes = int(match.group(3)) if match.group(3) else 0
-            seconds = int(match.group(4)) if match.group(4) else 0
-
-            if 0 <= hours <= 23 and 0 <= minutes <= 59 and 0 <= seconds <= 59:
-                return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
-            else:
-                raise RuntimeError(f"Invalid (time components out of range): {limit_str}")
-        else:
-            raise RuntimeError(f"Time limit retrieved does not match regular expression: {limit_str}")
+        raise RuntimeError(f"Invalid (time components out of range): {limit_str}")
 
 
 def parse_nodes(nodelist_str: str) -> dict[str, set[int]]:
-    if not re.match(r"^([a-z]+\[(?:\d+(?:-\d+)?,?)*\](?:,\s*[a-z]+\[(?:\d+(?:-\d+)?,?)*\])*)$", nodelist_str):
-        raise RuntimeError(f"Invalid nodelist: {nodelist_str}")
+    """Parses slurm hostlist expression like 'node[1-3,5],gpu[01-02],login1' in a single pass"""
     nodelist: dict[str, set[int]] = {}
-    for nsl in nodelist_str.split('],'):
-        nn, nr_s = nsl.strip().replace("]", "").split('[')
-        nodelist[nn] = set()
-        for item in nr_s.split(','):
-            if re.match(r"^\d+-\d+$", item.strip()):
-                nra, nrb = item.split('-')
-                for i in range(int(nra), int(nrb)+1):
-                    nodelist[nn].add(i)
-            elif re.match(r"\d+", item):
-                nodelist[nn].add(int(item))
-            else:
-                raise RuntimeError(f"Element not either an integer, nor range: {item}")
+    s = nodelist_str.strip()
+    n = len(s)
+    if n == 0:
+        raise RuntimeError(f"Invalid nodelist: {nodelist_str}")
+    i = 0
+    while i < n:
+        j = i
+        while j < n and s[j].isalpha():
+            j += 1
+        if j == i:
+            raise RuntimeError(f"Invalid nodelist: {nodelist_str}")
+        ids = nodelist.setdefault(s[i:j], set())
+
+        if j < n and s[j] == '[':
+            k = s.find(']', j)
+            if k == -1:
+                raise RuntimeError(f"Invalid nodelist: {nodelist_str}")
+            for item in s[j+1:k].split(','):
+                nra, sep, nrb = item.partition('-')
+                if sep:
+                    if not (nra.isdigit() and nrb.isdigit()):
+                        raise RuntimeError(f"Element not either an integer, nor range: {item}")
+                    ids.update(range(int(nra), int(nrb)+1))
+                elif item.isdigit():
+                    ids.add(int(item))
+                else:
+                    raise RuntimeError(f"Element not either an integer, nor range: {item}")
+            i = k + 1
+        else:
+            k = j
+            while k < n and s[k].isdigit():
+                k += 1
+            if k == j:
+                raise RuntimeError(f"Invalid nodelist: {nodelist_str}")
+            ids.add(int(s[j:k]))
+            i = k
+
+        if i < n:
+            if s[i] != ',':
+                raise RuntimeError(f"Invalid nodelist: {nodelist_str}")
+            i += 1
+            while i < n and s[i].isspace():
+                i += 1
+            if i == n:
+                raise RuntimeError(f"Invalid nodelist: {nodelist_str}")
 
     return nodelist
 
 
-def wexec(cmd: str) -> tuple[str, str]:
+def wexec(cmd: str, quiet: bool = False) -> tuple[str, str]:
+    """Runs cmd, raises CalledProcessError on non-zero exitcode. With quiet=True failure is logged at debug level, for callers that expect and handle it"""
     logger = log.get_logger()
     logger.debug(f"Calling '{cmd}'")
     cmds = shlex.split(cmd)
     try:
-        proc = subprocess.run(cmds, capture_output=True, check=True, env=os.environ.copy())
+        proc = subprocess.run(cmds, capture_output=True, check=True)
     except subprocess.CalledProcessError as e:
-        logger.error("Process returned non-zero exitcode")
-        logger.error("Output from stdout:")
-        logger.error(e.stdout)
-        logger.error("Output from stderr:")
-        logger.error(e.stderr)
+        level = logging.DEBUG if quiet else logging.ERROR
+        logger.log(level, "Process returned non-zero exitcode")
+        logger.log(level, "Output from stdout:")
+        logger.log(level, e.stdout)
+        logger.log(level, "Output from stderr:")
+        logger.log(level, e.stderr)
         raise
     return proc.stdout.decode().strip(), proc.stderr.decode().strip()
 
 
+@lru_cache(maxsize=8)
+def _load_toml(path: str, mtime_ns: int) -> dict[str, Any]:
+    with open(path, 'rb') as fp:
+        return tomllib.load(fp)
+
+
+def load_toml(path: Path) -> dict[str, Any]:
+    """Parsed TOML file, reused while the file's mtime is unchanged. Returns a private copy."""
+    path = path.resolve()
+    return copy.deepcopy(_load_toml(path.as_posix(), path.stat().st_mtime_ns))
+
+
+@lru_cache(maxsize=64)
 def is_exe(fpath: str | Path) -> bool:
     if shutil.which(fpath if isinstance(fpath, str) else fpath.as_posix()):
         return True
@@ -194,5 +267,50 @@ def is_exe(fpath: str | Path) -> bool:
     return False
 
 
+# linux inotify, see inotify(7)
+inotify_events: dict[str, int] = {
+    "close_write": 0x00000008,  # IN_CLOSE_WRITE
+    "create": 0x00000100 | 0x00000080,  # IN_CREATE | IN_MOVED_TO
+}
+inotify_event_header = struct.Struct("iIII")
+
+
+@lru_cache(maxsize=1)
+def _libc() -> ctypes.CDLL:
+    return ctypes.CDLL(None, use_errno=True)
+
+
+def inotify_watch(directory: Path, mask: int) -> int:
+    """Returns non-blocking inotify fd watching directory for events in mask. Raises OSError if inotify is unavailable"""
+    libc = _libc()
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+    if libc.inotify_add_watch(fd, os.fsencode(directory), ctypes.c_uint32(mask)) < 0:
+        errno = ctypes.get_errno()
+        os.close(fd)
+        raise OSError(errno, os.strerror(errno), directory.as_posix())
+    return fd
+
+
+def inotify_read_names(fd: int) -> list[str]:
+    """Drains pending events from inotify fd, returns names of files they refer to"""
+    names: list[str] = []
+    while True:
+        try:
+            buf = os.read(fd, 4096)
+        except BlockingIOError:
+            return names
+        if not buf:
+            return names
+        offset = 0
+        while offset < len(buf):
+            wd, mask, cookie, length = inotify_event_header.unpack_from(buf, offset)
+            offset += inotify_event_header.size
+            names.append(os.fsdecode(buf[offset:offset + length].rstrip(b"\0")))
+            offset += length
+
+
 if __name__ == "__main__":
     pass